@@ -10,41 +10,356 @@ unity_video_extract.py
 import os
 import sys
 import argparse
+import hashlib
+import heapq
+import json
+import mmap
+import re
 import struct
-from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    # 可选依赖 numpy：向量化扫描视频签名
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    # 可选依赖 numba：把 MP4 原子遍历编译成机器码
+    from numba import njit
+except ImportError:
+    njit = None
+
+# 各容器格式的魔数（MP4 为 ftyp 原子类型，WebM 为 EBML 头，Ogg 为页头）
+VIDEO_SIGNATURES = {
+    'mp4': b'ftyp',
+    'webm': b'\x1aE\xdf\xa3',
+    'ogg': b'OggS',
+}
+VIDEO_KINDS = tuple(VIDEO_SIGNATURES)
+# 与 VIDEO_KINDS 顺序一致，也用于快速判断文件中是否可能有视频
+VIDEO_MAGICS = tuple(VIDEO_SIGNATURES.values())
+
+# ftyp 后面的主品牌（isom、mp42、qt  、mmp4、XAVC 等），只要求是4个可打印 ASCII 字符，
+# 不使用固定的品牌列表，避免漏掉少见品牌的视频
+MP4_BRAND_RE = re.compile(rb'[\x20-\x7e]{4}')
+
+# numpy 向量化扫描的块大小，限制比较结果占用的内存
+NUMPY_SCAN_BLOCK_SIZE = 64 * 1024 * 1024
+
+# 单个文件最多尝试的候选位置数，防止异常数据导致解析次数失控
+MAX_CANDIDATES = 1 << 20
+
+# 写出视频时每次写入的块大小
+WRITE_CHUNK_SIZE = 1 << 20
+
+# Android 的 seccomp 可能直接以 SIGSYS 杀掉调用 copy_file_range 的进程，只在其他平台使用
+USE_COPY_FILE_RANGE = hasattr(os, 'copy_file_range') and not hasattr(sys, 'getandroidapilevel')
+
+# MP4 原子头：32位大小 + 32位类型（按大端整数比较）；大小为1时后面跟64位扩展大小
+ATOM_HEADER = struct.Struct('>II')
+ATOM_LARGESIZE = struct.Struct('>Q')
+# 原子类型按大端 uint32 表示时的值
+ATOM_FTYP = 0x66747970
+ATOM_MOOV = 0x6d6f6f76
+ATOM_MDAT = 0x6d646174
+# 单个视频最多解析的顶层原子数（分片 MP4 每个分片有 moof + mdat 两个原子）
+MP4_MAX_ATOMS = 1 << 16
+
+# MP4 关键原子，用于在 memoryview 上原地搜索（memoryview 没有 find/in）
+MP4_KEY_ATOM_RE = re.compile(rb'moov|mdat')
+MP4_FTYP_RE = re.compile(rb'ftyp')
+
+# UnityPy 能直接打开的文件头（AssetBundle、WebGL 包、APK/OBB 压缩包、gzip）
+UNITY_FILE_MAGICS = (b'UnityFS', b'UnityWeb', b'UnityRaw', b'UnityArchive', b'PK\x03\x04', b'\x1f\x8b')
+# SerializedFile 头部的 Unity 版本字符串，如 2019.4.40f1
+UNITY_VERSION_RE = re.compile(rb'\d+\.\d+\.\d+')
+
+# 视频对象索引保存在输出目录下的这个隐藏目录中
+VIDEO_INDEX_DIR = ".videoindex"
+
+# 目录扫描时跳过的文件：太小不可能包含视频，或者明显不是 Unity 资源
+MIN_FILE_SIZE = 1024
+SKIP_EXTENSIONS = ('.txt', '.json', '.xml', '.png', '.jpg')
+
+# EBML 元素 ID / Matroska 文档类型
+EBML_SEGMENT_ID = b'\x18\x53\x80\x67'
+EBML_DOCTYPE_RE = re.compile(rb'webm|matroska')
+# 真实的 EBML 头只有几十个字节，超过这个大小的一定是误匹配
+EBML_MAX_HEADER_SIZE = 256
 
 def ensure_dir(p):
     os.makedirs(p, exist_ok=True)
 
-def safe_print(*args, **kwargs):
-    print(*args, **kwargs, flush=True)
+def safe_print(*args, sep=' ', end='\n', **kwargs):
+    # 整行一次写出，多进程同时输出时不会交错
+    print(sep.join(map(str, args)) + end, end='', **kwargs, flush=True)
+
+def map_file(f):
+    """以只读 mmap 映射文件，避免把整个资源文件读入内存"""
+    try:
+        content = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (ValueError, OSError):
+        # 空文件或不支持 mmap 的文件系统，退回整体读取
+        return f.read()
+    
+    # 扫描是顺序进行的，提示内核加大预读
+    if hasattr(content, 'madvise') and hasattr(mmap, 'MADV_SEQUENTIAL'):
+        try:
+            content.madvise(mmap.MADV_SEQUENTIAL)
+        except OSError:
+            pass
+    return content
+
+def write_chunks(f, view):
+    """把 memoryview 分块写入已打开的文件"""
+    for off in range(0, len(view), WRITE_CHUNK_SIZE):
+        f.write(view[off:off + WRITE_CHUNK_SIZE])
+
+def write_video(video_path, video_data):
+    """通过 memoryview 分块写出视频，不生成整段 bytes 副本"""
+    with open(video_path, 'wb') as f:
+        write_chunks(f, memoryview(video_data))
+
+def kernel_copy(src_fd, dst_fd, offset, count):
+    """用 copy_file_range / sendfile 在内核中复制文件区间，返回实际复制的字节数"""
+    pos = offset
+    end = offset + count
+    
+    if USE_COPY_FILE_RANGE:
+        try:
+            while pos < end:
+                copied = os.copy_file_range(src_fd, dst_fd, end - pos, offset_src=pos)
+                if copied == 0:
+                    break
+                pos += copied
+        except OSError:
+            # 跨文件系统、旧内核等情况，改用 sendfile
+            pass
+    
+    if pos < end and hasattr(os, 'sendfile'):
+        try:
+            while pos < end:
+                copied = os.sendfile(dst_fd, src_fd, pos, end - pos)
+                if copied == 0:
+                    break
+                pos += copied
+        except OSError:
+            # macOS 等平台的 sendfile 只支持套接字
+            pass
+    
+    return pos - offset
+
+def copy_video(file_path, start_pos, video_data, video_path):
+    """把源文件中 start_pos 开始的视频直接复制到 video_path，数据不经过 Python
+    
+    内核复制不可用或只复制了一部分时，剩余部分从 video_data 写出。
+    """
+    view = memoryview(video_data)
+    with open(file_path, 'rb') as src, open(video_path, 'wb') as dst:
+        copied = kernel_copy(src.fileno(), dst.fileno(), start_pos, len(view))
+        write_chunks(dst, view[copied:])
+
+def candidate_start(kind, sig_pos):
+    """由签名位置推出容器起始位置，无效时返回 -1"""
+    # MP4 的 ftyp 之前还有4字节的大小字段
+    if kind == 'mp4':
+        return sig_pos - 4
+    return sig_pos
+
+def is_valid_hit(content, kind, sig_pos):
+    """魔数命中后的额外校验：MP4 的 ftyp 后面必须是可打印的品牌"""
+    if kind == 'mp4':
+        return MP4_BRAND_RE.match(content, sig_pos + 4) is not None
+    return True
+
+def iter_hits_numpy(content):
+    """用 numpy 向量化比较按顺序产出 (格式, 签名位置)
+    
+    把数据按4种对齐方式看作 uint32 数组，与各格式的4字节魔数整体比较，
+    每块只需几次向量运算；命中后再校验 MP4 品牌。
+    """
+    magic_values = [int.from_bytes(magic, sys.byteorder) for magic in VIDEO_MAGICS]
+    total = len(content)
+    
+    for offset in range(0, total, NUMPY_SCAN_BLOCK_SIZE):
+        # 多取3字节，让从块内最后一个字节开始的魔数也能完整比较
+        block_len = min(NUMPY_SCAN_BLOCK_SIZE + 3, total - offset)
+        positions = []
+        kinds = []
+        for align in range(4):
+            count = (block_len - align) // 4
+            if count <= 0:
+                continue
+            words = np.frombuffer(content, dtype=np.uint32, count=count, offset=offset + align)
+            for kind_index, value in enumerate(magic_values):
+                hits = np.flatnonzero(words == value)
+                if hits.size:
+                    positions.append(hits * 4 + (offset + align))
+                    kinds.append(np.full(hits.size, kind_index))
+        if not positions:
+            continue
+        
+        positions = np.concatenate(positions)
+        kinds = np.concatenate(kinds)
+        order = np.argsort(positions, kind='stable')
+        for sig_pos, kind_index in zip(positions[order].tolist(), kinds[order].tolist()):
+            kind = VIDEO_KINDS[kind_index]
+            if is_valid_hit(content, kind, sig_pos):
+                yield kind, sig_pos
+
+def iter_magic_positions(content, magic, kind):
+    """逐个查找单个魔数出现的位置，产出 (位置, 格式)"""
+    pos = content.find(magic)
+    while pos != -1:
+        yield pos, kind
+        pos = content.find(magic, pos + 1)
+
+def iter_hits_find(content):
+    """没有 numpy 时，各魔数分别用 find 查找，再按位置合并，产出 (格式, 签名位置)"""
+    streams = [
+        iter_magic_positions(content, magic, kind)
+        for kind, magic in zip(VIDEO_KINDS, VIDEO_MAGICS)
+    ]
+    for sig_pos, kind in heapq.merge(*streams):
+        if is_valid_hit(content, kind, sig_pos):
+            yield kind, sig_pos
+
+def iter_video_candidates(content):
+    """按顺序产出 (格式, 起始位置)，覆盖所有支持的视频容器"""
+    if np is not None:
+        hits = iter_hits_numpy(content)
+    else:
+        hits = iter_hits_find(content)
+    
+    for kind, sig_pos in hits:
+        start_pos = candidate_start(kind, sig_pos)
+        if start_pos >= 0:
+            yield kind, start_pos
+
+if njit is not None:
+    @njit(cache=True)
+    def walk_atoms_jit(buf, start, end, max_atoms):
+        """parse_mp4_atoms 的 numba 版本，返回 (位置, 大小, 类型) 三个数组"""
+        # 大多数视频只有几个顶层原子，数组按需倍增
+        capacity = min(64, max_atoms)
+        positions = np.empty(capacity, np.int64)
+        sizes = np.empty(capacity, np.int64)
+        types = np.empty(capacity, np.uint32)
+        n = 0
+        pos = start
+        
+        while pos + 8 <= end and n < max_atoms:
+            size = np.int64(0)
+            for k in range(4):
+                size = (size << 8) | np.int64(buf[pos + k])
+            atom_type = np.uint32(0)
+            printable = True
+            for k in range(4):
+                c = buf[pos + 4 + k]
+                if c < 0x20 or c > 0x7e:
+                    printable = False
+                atom_type = (atom_type << np.uint32(8)) | np.uint32(c)
+            
+            # 64位扩展大小，最高位为1的值远超文件大小，直接视为无效
+            if size == 1:
+                if pos + 16 > end or buf[pos + 8] >= 0x80:
+                    break
+                size = np.int64(0)
+                for k in range(8):
+                    size = (size << 8) | np.int64(buf[pos + 8 + k])
+                if size < 16:
+                    break
+            
+            if size < 8 or size > end - pos or not printable:
+                break
+            # ftyp 只能是第一个原子，再次出现说明已经是下一个视频
+            if n > 0 and atom_type == ATOM_FTYP:
+                break
+            
+            if n == capacity:
+                capacity = min(capacity * 2, max_atoms)
+                new_positions = np.empty(capacity, np.int64)
+                new_sizes = np.empty(capacity, np.int64)
+                new_types = np.empty(capacity, np.uint32)
+                new_positions[:n] = positions[:n]
+                new_sizes[:n] = sizes[:n]
+                new_types[:n] = types[:n]
+                positions = new_positions
+                sizes = new_sizes
+                types = new_types
+            
+            positions[n] = pos
+            sizes[n] = size
+            types[n] = atom_type
+            n += 1
+            
+            pos += size
+        
+        return positions[:n], sizes[:n], types[:n]
+else:
+    walk_atoms_jit = None
 
-def parse_mp4_atoms(data, start_pos=0):
-    """解析 MP4 原子结构，找到完整的视频文件"""
+def parse_mp4_atoms(data: memoryview, start_pos=0, max_atoms=MP4_MAX_ATOMS):
+    """解析 MP4 原子结构，找到完整的视频文件（data 为 memoryview，解析时不复制数据）
+    
+    返回 [(类型, 位置, 大小), ...]，类型为大端 uint32 整数（如 ATOM_MOOV）。
+    一直解析到下一个原子头不合法、或者遇到下一个视频的 ftyp 为止（分片 MP4 的
+    moof/mdat、结尾的 udta/mfra 等都属于视频），最多解析 max_atoms 个原子。
+    """
+    # 安装了 numba 时，遍历交给编译后的版本
+    if walk_atoms_jit is not None:
+        buf = np.frombuffer(data, dtype=np.uint8)
+        positions, sizes, types = walk_atoms_jit(buf, start_pos, len(buf), max_atoms)
+        return list(zip(types.tolist(), positions.tolist(), sizes.tolist()))
+    
     atoms = []
     pos = start_pos
+    data_len = len(data)
     
-    while pos < len(data) - 8:  # 至少需要8字节来读取原子头
-        # 读取原子大小和类型（大端）
-        if pos + 8 > len(data):
-            break
-            
-        atom_size = struct.unpack('>I', data[pos:pos+4])[0]
-        atom_type = data[pos+4:pos+8]
+    while pos + 8 <= data_len:  # 至少需要8字节来读取原子头
+        # 一次读取原子大小和类型（大端）
+        atom_size, atom_type = ATOM_HEADER.unpack_from(data, pos)
+        
+        # 64位扩展大小（大型 mdat）
+        if atom_size == 1:
+            if pos + 16 > data_len:
+                break
+            atom_size = ATOM_LARGESIZE.unpack_from(data, pos + 8)[0]
+            if atom_size < 16:
+                break
         
         # 验证原子大小合理性
-        if atom_size < 8 or atom_size > len(data) - pos:
+        if atom_size < 8 or atom_size > data_len - pos:
+            break
+        
+        # 类型不是4个可打印 ASCII 字符（0x20-0x7e），说明已经离开 MP4 数据
+        # 每个字节都小于 0x80 时，加 0x60 / 加 1 不会向相邻字节进位，可以4字节一起判断
+        if (atom_type & 0x80808080
+                or (atom_type + 0x60606060) & 0x80808080 != 0x80808080
+                or (atom_type + 0x01010101) & 0x80808080):
+            break
+        
+        # ftyp 只能是第一个原子，再次出现说明已经是下一个视频
+        if atoms and atom_type == ATOM_FTYP:
             break
             
         atoms.append((atom_type, pos, atom_size))
         
+        # 原子数量过多时停止
+        if len(atoms) >= max_atoms:
+            break
+        
         # 移动到下一个原子
         pos += atom_size
     
     return atoms
 
 def extract_mp4_video(data, start_pos):
-    """从指定位置提取完整的 MP4 视频文件"""
+    """从指定位置提取完整的 MP4 视频文件
+    
+    返回 (memoryview 切片, 可以继续扫描的位置)，失败时返回 None。
+    """
     try:
         # 解析 MP4 原子结构
         atoms = parse_mp4_atoms(data, start_pos)
@@ -57,9 +372,9 @@ def extract_mp4_video(data, start_pos):
         mdat_pos = None
         
         for atom_type, pos, size in atoms:
-            if atom_type == b'moov':
+            if atom_type == ATOM_MOOV:
                 moov_pos = pos
-            elif atom_type == b'mdat':
+            elif atom_type == ATOM_MDAT:
                 mdat_pos = pos
         
         # 如果有 moov 原子，尝试找到完整的文件范围
@@ -68,23 +383,21 @@ def extract_mp4_video(data, start_pos):
             last_atom = atoms[-1]
             end_pos = last_atom[1] + last_atom[2]
             
-            # 提取完整的 MP4 文件
-            video_data = data[start_pos:end_pos]
-            
-            # 验证文件头
-            if video_data.startswith(b'ftyp'):
-                return video_data
+            # 验证文件头（第一个原子必须是 ftyp）
+            if atoms[0][0] == ATOM_FTYP:
+                # 提取完整的 MP4 文件，结构完整时可以直接跳过整个视频
+                return data[start_pos:end_pos], end_pos
         
         # 如果没有找到完整的结构，尝试提取一定大小的数据
         # MP4 文件通常至少有几个关键原子
         if len(data) - start_pos > 1000:  # 至少1KB
             # 尝试提取最多100MB的数据
             end_pos = min(start_pos + 100 * 1024 * 1024, len(data))
-            video_data = data[start_pos:end_pos]
             
             # 验证是否包含关键原子
-            if b'moov' in video_data or b'mdat' in video_data:
-                return video_data
+            if MP4_KEY_ATOM_RE.search(data, start_pos, end_pos):
+                # 结束位置只是估计值，其中可能还有别的视频，只跳过当前文件头
+                return data[start_pos:end_pos], start_pos + 8
         
         return None
         
@@ -92,57 +405,174 @@ def extract_mp4_video(data, start_pos):
         safe_print(f"MP4 提取错误: {e}")
         return None
 
-def extract_unity_videos(file_path, output_dir):
+def read_ebml_size(data, pos):
+    """读取 EBML 变长整数（元素大小），返回 (值, 字节数)，未知大小时值为 None"""
+    first = data[pos]
+    if first == 0:
+        raise ValueError("无效的 EBML 长度")
+    length = 9 - first.bit_length()
+    value = first & ((1 << (8 - length)) - 1)
+    for b in data[pos+1:pos+length]:
+        value = (value << 8) | b
+    # 所有数据位全为1表示未知大小
+    if value == (1 << (7 * length)) - 1:
+        value = None
+    return value, length
+
+def extract_webm_video(data, start_pos):
+    """从 EBML 头开始提取完整的 WebM/MKV 视频文件
+    
+    返回 (memoryview 切片, 可以继续扫描的位置)，失败时返回 None。
+    """
+    try:
+        # EBML 头：4字节 ID + 变长大小
+        header_size, size_len = read_ebml_size(data, start_pos + 4)
+        if header_size is None:
+            return None
+        header_end = start_pos + 4 + size_len + header_size
+        if header_size > EBML_MAX_HEADER_SIZE or header_end > len(data):
+            return None
+        
+        # 文档类型必须是 webm 或 matroska
+        if not EBML_DOCTYPE_RE.search(data, start_pos, header_end):
+            return None
+        
+        # 紧随其后的是 Segment，它的大小决定了整个文件的范围
+        if data[header_end:header_end+4] != EBML_SEGMENT_ID:
+            return None
+        segment_size, size_len = read_ebml_size(data, header_end + 4)
+        if segment_size is None:
+            # 流式写入的文件没有记录大小，无法确定结束位置
+            return None
+        end_pos = header_end + 4 + size_len + segment_size
+        if end_pos > len(data):
+            return None
+        
+        return data[start_pos:end_pos], end_pos
+        
+    except Exception as e:
+        safe_print(f"WebM 提取错误: {e}")
+        return None
+
+def extract_ogg_video(data, start_pos):
+    """从第一个 Ogg 页开始提取完整的 Ogg 视频（含 Theora 流）
+    
+    返回 (memoryview 切片, 可以继续扫描的位置)，失败时返回 None。
+    """
+    try:
+        pos = start_pos
+        data_len = len(data)
+        streams = set()
+        ended = set()
+        has_video = False
+        
+        while pos + 27 <= data_len and data[pos:pos+4] == b'OggS' and data[pos+4] == 0:
+            header_type = data[pos+5]
+            serial = struct.unpack_from('<I', data, pos+14)[0]
+            segment_count = data[pos+26]
+            body_pos = pos + 27 + segment_count
+            if body_pos > data_len:
+                break
+            page_end = body_pos + sum(data[pos+27:body_pos])
+            if page_end > data_len:
+                break
+            
+            if header_type & 0x02:
+                # 流开始页，Theora 标识头说明这是视频
+                streams.add(serial)
+                if data[body_pos:body_pos+7] == b'\x80theora':
+                    has_video = True
+            elif serial not in streams:
+                # 不属于当前文件的页
+                break
+            
+            if header_type & 0x04:
+                ended.add(serial)
+            
+            pos = page_end
+            
+            # 所有逻辑流都已结束
+            if ended >= streams:
+                break
+        
+        if not has_video:
+            return None
+        
+        return data[start_pos:pos], pos
+        
+    except Exception as e:
+        safe_print(f"Ogg 提取错误: {e}")
+        return None
+
+# 各格式对应的提取函数和输出扩展名
+VIDEO_EXTRACTORS = {
+    'mp4': (extract_mp4_video, '.mp4'),
+    'webm': (extract_webm_video, '.webm'),
+    'ogg': (extract_ogg_video, '.ogv'),
+}
+
+def file_output_dir_for(output_dir, file_path, input_root, suffix):
+    """输入文件对应的输出目录
+    
+    使用相对 input_root 的路径和完整文件名（含扩展名），不同子目录中的同名文件、
+    以及 sharedassets0.assets / sharedassets0.resource 这样的文件不会写到同一个目录。
+    input_root 为 None（单个文件输入）时只使用文件名。
+    """
+    if input_root is None:
+        rel_path = os.path.basename(file_path)
+    else:
+        rel_path = os.path.relpath(file_path, input_root)
+    return os.path.join(output_dir, rel_path + suffix)
+
+def extract_unity_videos(file_path, output_dir, input_root=None):
     """专门提取 Unity 中的视频资源"""
     try:
         safe_print(f"提取视频资源: {os.path.basename(file_path)}")
         
-        # 创建输出目录
-        file_name = Path(file_path).stem
-        file_output_dir = os.path.join(output_dir, file_name + "_videos")
-        ensure_dir(file_output_dir)
+        file_output_dir = file_output_dir_for(output_dir, file_path, input_root, "_videos")
         
         with open(file_path, 'rb') as f:
-            content = f.read()
+            content = map_file(f)
+        
+        # 大多数资源文件根本不含视频签名，find 命中即返回，比完整扫描便宜得多
+        if all(content.find(magic) == -1 for magic in VIDEO_MAGICS):
+            return 0
+        mv = memoryview(content)
         
         extracted_count = 0
         
-        # 查找所有可能的 MP4 文件起始位置
-        pos = 0
         video_index = 0
+        next_pos = 0
+        attempts = 0
         
-        while True:
-            # 查找 ftyp 原子（MP4 文件开始）
-            pos = content.find(b'ftyp', pos)
-            if pos == -1:
-                break
-            
-            # ftyp 原子应该至少在前面有4字节的大小字段
-            if pos < 4:
-                pos += 1
+        # 遍历所有可能的视频文件起始位置
+        for kind, start_pos in iter_video_candidates(content):
+            # 跳过已经提取过的区域
+            if start_pos < next_pos:
                 continue
             
-            # 检查是否真的是 MP4 文件头
-            start_pos = pos - 4
-            if start_pos < 0:
-                pos += 1
-                continue
+            attempts += 1
+            if attempts > MAX_CANDIDATES:
+                safe_print(f"  候选位置超过 {MAX_CANDIDATES} 个，停止扫描")
+                break
             
-            # 尝试提取完整的 MP4 文件
-            video_data = extract_mp4_video(content, start_pos)
+            # 按格式尝试提取完整的视频文件
+            extractor, ext = VIDEO_EXTRACTORS[kind]
+            result = extractor(mv, start_pos)
+            if not result:
+                continue
+            video_data, next_pos = result
             
-            if video_data and len(video_data) > 1000:  # 至少1KB
-                # 保存视频文件
-                video_path = os.path.join(file_output_dir, f"video_{video_index}.mp4")
-                with open(video_path, 'wb') as f:
-                    f.write(video_data)
+            if len(video_data) > 1000:  # 至少1KB
+                # 保存视频文件（找到第一个视频时才创建输出目录）
+                if video_index == 0:
+                    ensure_dir(file_output_dir)
+                video_path = os.path.join(file_output_dir, f"video_{video_index}{ext}")
+                copy_video(file_path, start_pos, video_data, video_path)
                 
-                safe_print(f"  提取视频: video_{video_index}.mp4 ({len(video_data)} 字节)")
+                safe_print(f"  提取视频: video_{video_index}{ext} ({len(video_data)} 字节)")
                 extracted_count += 1
                 video_index += 1
-            
-            # 移动到下一个可能的位置
-            pos += 4
         
         return extracted_count
         
@@ -150,71 +580,161 @@ def extract_unity_videos(file_path, output_dir):
         safe_print(f"视频提取失败: {e}")
         return 0
 
-def extract_unitypy_videos(file_path, output_dir):
+def is_unity_file(file_path):
+    """根据文件头判断是否为 UnityPy 能加载的文件，避免对纯资源文件做完整解析"""
+    try:
+        with open(file_path, 'rb') as f:
+            head = f.read(64)
+    except OSError:
+        return False
+    
+    if head.startswith(UNITY_FILE_MAGICS):
+        return True
+    
+    # SerializedFile（.assets、level0 等）没有魔数，检查格式版本号和随后的 Unity 版本字符串
+    if len(head) < 20:
+        return False
+    version = struct.unpack_from('>I', head, 8)[0]
+    if 9 <= version < 22:
+        return UNITY_VERSION_RE.match(head, 20) is not None
+    if 22 <= version <= 50:
+        # 22 及以后的版本头部使用64位字段，版本字符串后移
+        return UNITY_VERSION_RE.match(head, 48) is not None
+    return False
+
+def video_index_path(output_dir, file_path):
+    """视频对象索引文件的路径，按输入文件的绝对路径区分"""
+    key = hashlib.sha1(os.path.realpath(file_path).encode('utf-8', 'surrogateescape')).hexdigest()
+    return os.path.join(output_dir, VIDEO_INDEX_DIR, key + ".json")
+
+def load_video_index(output_dir, file_path, stat, unitypy_version):
+    """读取上次记录的文件中是否有视频对象
+    
+    文件已变化、UnityPy 版本不同（新版本可能读得懂旧版本解析不了的资源包）
+    或者没有记录时返回 None。
+    """
+    try:
+        with open(video_index_path(output_dir, file_path), 'r', encoding='utf-8') as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if (index.get('mtime_ns') != stat.st_mtime_ns or index.get('size') != stat.st_size
+            or index.get('unitypy') != unitypy_version):
+        return None
+    return index.get('has_videos')
+
+def save_video_index(output_dir, file_path, stat, unitypy_version, has_videos):
+    """记录文件中是否有视频对象，下次运行可直接跳过没有视频的文件"""
+    index_path = video_index_path(output_dir, file_path)
+    try:
+        ensure_dir(os.path.dirname(index_path))
+        # 先写临时文件再替换，多进程同时写入时不会留下半个文件
+        tmp_path = f"{index_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size,
+                       'unitypy': unitypy_version, 'has_videos': has_videos}, f)
+        os.replace(tmp_path, index_path)
+    except OSError:
+        pass
+
+def video_buffer(candidate):
+    """把 UnityPy 对象属性转换为可以切片的缓冲区，无法转换时返回 None"""
+    if candidate is None:
+        return None
+    if isinstance(candidate, (bytes, bytearray, memoryview)):
+        return candidate
+    if isinstance(candidate, list):
+        # 新版 UnityPy 中 m_MovieData 是整数列表
+        try:
+            return bytes(candidate)
+        except (TypeError, ValueError):
+            return None
+    if hasattr(candidate, 'getbuffer'):
+        # BytesIO 等直接取内部缓冲区，不复制
+        return candidate.getbuffer()
+    if isinstance(getattr(candidate, 'view', None), memoryview):
+        # UnityPy 基于 memoryview 的 EndianBinaryReader
+        return candidate.view
+    if hasattr(candidate, 'read'):
+        try:
+            candidate.seek(0)
+            return candidate.read()
+        except Exception:
+            pass
+    return None
+
+def extract_unitypy_videos(file_path, output_dir, input_root=None):
     """使用 UnityPy 提取视频资源"""
     try:
         import UnityPy
+        from UnityPy.enums import ClassIDType
+        
+        # 上次运行（同一 UnityPy 版本）已确认没有视频对象的文件，不必再次解析
+        stat = os.stat(file_path)
+        unitypy_version = getattr(UnityPy, '__version__', None)
+        if load_video_index(output_dir, file_path, stat, unitypy_version) is False:
+            safe_print(f"  索引记录中没有视频对象，跳过 UnityPy: {os.path.basename(file_path)}")
+            return 0
         
         safe_print(f"使用 UnityPy 提取视频: {os.path.basename(file_path)}")
         
         # 创建输出目录
-        file_name = Path(file_path).stem
-        file_output_dir = os.path.join(output_dir, file_name + "_unitypy_videos")
+        file_output_dir = file_output_dir_for(output_dir, file_path, input_root, "_unitypy_videos")
         ensure_dir(file_output_dir)
         
         # 加载 Unity 环境
         env = UnityPy.load(file_path)
         
-        # 获取所有对象
-        objects = list(env.objects)
-        safe_print(f"  找到 {len(objects)} 个对象")
-        
         extracted_count = 0
+        has_videos = False
         
-        # 提取每个对象
-        for i, obj in enumerate(objects):
+        # 视频相关类型，以及各类型存放视频数据的属性
+        video_attrs = {
+            ClassIDType.VideoClip: 'm_VideoData',
+            ClassIDType.MovieTexture: 'm_MovieData',
+        }
+        video_types = set(video_attrs)
+        
+        # 直接遍历 env.objects，不再复制一份对象列表
+        i = -1  # 没有对象时循环不会给 i 赋值
+        for i, obj in enumerate(env.objects):
+            # 只处理视频相关类型（直接比较枚举，不必生成类型名字符串）
+            if obj.type not in video_types:
+                continue
+            has_videos = True
+            
             try:
-                # 获取对象类型
-                obj_type = obj.type.name if hasattr(obj, 'type') and hasattr(obj.type, 'name') else "Unknown"
-                
-                # 只处理视频相关类型
-                if obj_type not in ["VideoClip", "MovieTexture"]:
-                    continue
+                obj_type = obj.type.name
                 
                 # 尝试读取对象数据
                 data = obj.read()
                 
-                # 尝试提取视频数据
-                raw_data = None
-                
-                # 尝试不同的属性名
-                for attr in ['m_VideoData', 'm_MovieData', 'data', 'bytes', 'm_Data']:
-                    if hasattr(data, attr):
-                        candidate = getattr(data, attr)
-                        if isinstance(candidate, (bytes, bytearray)):
-                            raw_data = candidate
-                            break
-                        elif hasattr(candidate, 'read'):
-                            try:
-                                candidate.seek(0)
-                                raw_data = candidate.read()
+                # 先读取该类型对应的属性，只有取不到时才逐个尝试其他属性名
+                raw_data = video_buffer(getattr(data, video_attrs[obj.type], None))
+                if raw_data is None:
+                    for attr in ['m_VideoData', 'm_MovieData', 'data', 'bytes', 'm_Data']:
+                        if hasattr(data, attr):
+                            raw_data = video_buffer(getattr(data, attr))
+                            if raw_data is not None:
                                 break
-                            except:
-                                pass
                 
                 if raw_data and len(raw_data) > 1000:
+                    # 统一按 memoryview 处理，后续查找和切片都不复制数据
+                    raw_data = memoryview(raw_data)
+                    
                     # 检查是否是有效的 MP4 文件
-                    if raw_data.startswith(b'ftyp'):
+                    if raw_data[:4] == b'ftyp':
                         ext = '.mp4'
                     else:
                         # 尝试在数据中查找 MP4 文件头
-                        ftyp_pos = raw_data.find(b'ftyp')
+                        match = MP4_FTYP_RE.search(raw_data)
+                        ftyp_pos = match.start() if match else -1
                         if ftyp_pos != -1 and ftyp_pos >= 4:
                             # 提取从 ftyp 开始的数据
                             start_pos = ftyp_pos - 4
-                            video_data = extract_mp4_video(raw_data, start_pos)
-                            if video_data:
-                                raw_data = video_data
+                            result = extract_mp4_video(raw_data, start_pos)
+                            if result:
+                                raw_data = result[0]
                                 ext = '.mp4'
                             else:
                                 ext = '.bin'
@@ -223,8 +743,7 @@ def extract_unitypy_videos(file_path, output_dir):
                     
                     if ext == '.mp4':
                         video_path = os.path.join(file_output_dir, f"unitypy_{obj_type}_{i}.mp4")
-                        with open(video_path, 'wb') as f:
-                            f.write(raw_data)
+                        write_video(video_path, raw_data)
                         
                         extracted_count += 1
                         safe_print(f"  提取视频: unitypy_{obj_type}_{i}.mp4")
@@ -233,16 +752,85 @@ def extract_unitypy_videos(file_path, output_dir):
                 # 忽略单个对象的错误
                 continue
         
+        safe_print(f"  扫描完毕: {i + 1} 个对象")
+        save_video_index(output_dir, file_path, stat, unitypy_version, has_videos)
         return extracted_count
         
     except Exception as e:
         safe_print(f"UnityPy 视频提取失败: {e}")
         return 0
 
+def process_file(file_path, output_path, input_root=None):
+    """处理单个文件，返回提取的视频数量（顶层函数，便于多进程调用）"""
+    file_size = os.path.getsize(file_path)
+    safe_print(f"处理文件: {os.path.basename(file_path)} ({file_size} 字节)")
+    
+    # 首先尝试使用 UnityPy 提取（.resS/.resource 等纯数据文件直接跳过）
+    extracted = 0
+    if is_unity_file(file_path):
+        extracted = extract_unitypy_videos(file_path, output_path, input_root)
+    
+    # 如果 UnityPy 没有提取到视频，尝试二进制提取
+    if extracted == 0:
+        extracted = extract_unity_videos(file_path, output_path, input_root)
+    
+    return extracted
+
+def iter_input_files(root, exclude=None):
+    """用 os.scandir 递归列出待处理的文件，边扫描边产出，跳过隐藏项、小文件和无关扩展名
+    
+    exclude 为需要跳过的目录（输出目录位于输入目录内时，避免处理刚提取出的视频）。
+    """
+    try:
+        with os.scandir(root) as it:
+            for entry in it:
+                if entry.name.startswith('.'):
+                    continue
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if exclude and os.path.realpath(entry.path) == exclude:
+                            continue
+                        yield from iter_input_files(entry.path, exclude)
+                    elif (entry.is_file(follow_symlinks=False)
+                            and not entry.name.lower().endswith(SKIP_EXTENSIONS)
+                            and entry.stat().st_size >= MIN_FILE_SIZE):
+                        yield entry.path
+                except OSError:
+                    continue
+    except OSError as e:
+        safe_print(f"无法读取目录: {root} ({e})")
+
+def process_files(files, output_path, jobs, input_root=None):
+    """按 jobs 个进程并行处理文件，按原顺序产出 (文件路径, 提取的视频数量)
+    
+    files 可以是生成器：边列出文件边提交任务，目录扫描和提取同时进行。
+    input_root 为输入目录，输出目录按文件相对它的路径区分。
+    """
+    if jobs > 1:
+        try:
+            executor = ProcessPoolExecutor(max_workers=jobs)
+        except (NotImplementedError, ImportError, OSError) as e:
+            # 部分 Android/Termux 环境缺少 sem_open，退回单进程
+            safe_print(f"无法启用多进程，改为单进程处理: {e}")
+            executor = None
+        
+        if executor is not None:
+            with executor:
+                futures = [(file_path, executor.submit(process_file, file_path, output_path, input_root))
+                           for file_path in files]
+                for file_path, future in futures:
+                    yield file_path, future.result()
+            return
+    
+    for file_path in files:
+        yield file_path, process_file(file_path, output_path, input_root)
+
 def main():
     parser = argparse.ArgumentParser(description="Unity 视频资源专门提取工具")
     parser.add_argument("--input", "-i", required=True, help="Unity 游戏的 Data 目录或资源文件")
     parser.add_argument("--out", "-o", required=True, help="输出目录")
+    parser.add_argument("--jobs", "-j", type=int, default=os.cpu_count() or 1,
+                        help="并行处理的进程数（默认为 CPU 核心数）")
     args = parser.parse_args()
 
     input_path = args.input
@@ -254,36 +842,24 @@ def main():
     
     ensure_dir(output_path)
     
-    # 收集目标文件
+    # 收集目标文件（目录时边扫描边处理）
     if os.path.isfile(input_path):
         files = [input_path]
+        input_root = None
+        jobs = 1
     else:
-        files = []
-        for root, _, filenames in os.walk(input_path):
-            for filename in filenames:
-                if filename.startswith('.'):
-                    continue
-                files.append(os.path.join(root, filename))
-    
-    safe_print(f"找到 {len(files)} 个文件")
+        files = iter_input_files(input_path, exclude=os.path.realpath(output_path))
+        input_root = input_path
+        jobs = max(1, args.jobs)
     
+    total_files = 0
     total_extracted = 0
     
-    for i, file_path in enumerate(files, 1):
-        file_size = os.path.getsize(file_path)
-        safe_print(f"处理文件 {i}/{len(files)}: {os.path.basename(file_path)} ({file_size} 字节)")
-        
-        # 首先尝试使用 UnityPy 提取
-        extracted = extract_unitypy_videos(file_path, output_path)
-        
-        # 如果 UnityPy 没有提取到视频，尝试二进制提取
-        if extracted == 0:
-            extracted = extract_unity_videos(file_path, output_path)
-        
+    for total_files, (file_path, extracted) in enumerate(process_files(files, output_path, jobs, input_root), 1):
         total_extracted += extracted
-        safe_print(f"  该文件提取了 {extracted} 个视频")
+        safe_print(f"完成文件 {total_files}: {os.path.basename(file_path)}，提取了 {extracted} 个视频")
     
-    safe_print(f"视频提取完成！共提取 {total_extracted} 个视频文件。")
+    safe_print(f"视频提取完成！共处理 {total_files} 个文件，提取 {total_extracted} 个视频文件。")
     safe_print(f"输出目录: {output_path}")
 
 if __name__ == "__main__":